@@ -0,0 +1,17 @@
+# arb_kernels_aot.py - AOT-сборка ядер анализа в расширение arb_kernels (без JIT на старте)
+# Сборка: python arb_kernels_aot.py
+from numba.pycc import CC
+from arbitrage_kernels import counting_sort, scan_symbols
+
+cc = CC('arb_kernels')
+
+cc.export('counting_sort', 'Tuple((i8[:], i8[:]))(i4[:], i8)')(counting_sort.py_func)
+
+# AOT не поддерживает parallel=True: prange компилируется как обычный цикл
+cc.export(
+    'scan_symbols',
+    'Tuple((i8[:], i8[:], f4[:]))(i8[:], f4[:], f4[:], f4[:], f8[:], i4[:], f4, f4, f8, f8)'
+)(scan_symbols.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
@@ -1,9 +1,35 @@
 # arbitrage_analyzer.py - Упрощенный анализатор без базы данных
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 import logging
-from collections import defaultdict
+import time
+import numpy as np
 from data_models import PriceData, ArbitrageOpportunity, NotificationManager
+try:
+    # Необязательная AOT-сборка ядра (python arb_kernels_aot.py): без JIT-компиляции на старте,
+    # но последовательная - в Docker образе не собирается, там работает параллельное JIT-ядро
+    from arb_kernels import counting_sort, scan_symbols
+except ImportError:
+    from arbitrage_kernels import counting_sort, scan_symbols
+
+# Максимальный возраст цены для анализа (секунды)
+MAX_PRICE_AGE_SECONDS = 300
+
+# Запас порога для float32-ядра (процентные пункты): погрешность спреда во float32 ~1e-5 п.п.,
+# граничные пары отбираются с запасом и окончательно проверяются во float64
+_KERNEL_THRESHOLD_SLACK = 1e-3
+
+# Поля плоского представления цен (SoA): заполняются за один проход по PriceData
+_PRICE_FIELDS = np.dtype([
+    ('price', np.float64),
+    # Для порогового отбора хватает float32: вдвое больше элементов на вектор
+    ('ask', np.float32),
+    ('bid', np.float32),
+    ('volume', np.float32),
+    ('timestamp', np.float64),
+    ('exchange', np.int32),
+    ('symbol', np.int32),
+])
 
 class ArbitrageAnalyzer:
     def __init__(self, config):
@@ -18,103 +44,181 @@ class ArbitrageAnalyzer:
             'alerts_sent': 0,
             'start_time': datetime.now()
         }
+        
+        # Интернирование символов: постоянный числовой id для группировки
+        self._symbol_ids: Dict[str, int] = {}
+        self._exchange_ids: Dict[str, int] = {}
+        self._exchange_names: List[str] = []
+        
+        # Последний анализ (price_data, время, раскладка) - для обзора рынка без повторного прохода
+        self._last_scan = None
     
-    def analyze_arbitrage_opportunities(self, price_data: List[PriceData]) -> List[ArbitrageOpportunity]:
-        """Анализ возможностей арбитража"""
-        opportunities = []
+    def _symbol_id(self, symbol: str) -> int:
+        """Числовой идентификатор символа"""
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._symbol_ids[symbol] = len(self._symbol_ids)
+        return symbol_id
+    
+    def _exchange_id(self, exchange: str) -> int:
+        """Числовой идентификатор биржи"""
+        exchange_id = self._exchange_ids.get(exchange)
+        if exchange_id is None:
+            exchange_id = self._exchange_ids[exchange] = len(self._exchange_names)
+            self._exchange_names.append(exchange)
+        return exchange_id
+    
+    def _group_by_symbol(self, sym_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Упорядочивание индексов цен по символам и границы сегментов"""
+        # Сортировка подсчетом: группы идут по id символа, внутри группы - исходный порядок
+        order, starts = counting_sort(sym_ids, len(self._symbol_ids))
+        group_starts = starts[:-1][np.diff(starts) > 0]
+        return order, group_starts[1:]
+    
+    def _layout(self, price_data: List[PriceData]) -> tuple:
+        """Плоские массивы цен (SoA) и группировка по символам: (fields, order, starts, sizes, grouped)"""
+        # Раскладываем данные в плоские массивы (SoA) за один проход по объектам
+        n = len(price_data)
+        fields = np.fromiter(
+            ((p.price or np.nan, p.ask or np.nan, p.bid or np.nan, p.volume_24h, p.timestamp,
+              self._exchange_id(p.exchange), self._symbol_id(p.symbol)) for p in price_data),
+            dtype=_PRICE_FIELDS, count=n
+        )
         
-        # Группируем цены по символам
-        prices_by_symbol = defaultdict(list)
-        for price in price_data:
-            prices_by_symbol[price.symbol].append(price)
+        # Группируем по символам: сегменты индексов в общих массивах
+        order, boundaries = self._group_by_symbol(fields['symbol'])
+        starts = np.r_[0, boundaries].astype(np.int64)
+        sizes = np.diff(np.r_[starts, n])
         
-        # Анализируем каждый символ
-        for symbol, prices in prices_by_symbol.items():
-            if len(prices) < 2:  # Нужно минимум 2 биржи
-                continue
-                
-            symbol_opportunities = self._analyze_symbol(symbol, prices)
-            opportunities.extend(symbol_opportunities)
+        # Поля в порядке символов - непрерывные сегменты
+        grouped = fields[order]
+        return fields, order, starts, sizes, grouped
+    
+    def _scan(self, price_data: List[PriceData]) -> List[ArbitrageOpportunity]:
+        """Один проход по ценам: возможности арбитража (раскладка сохраняется для обзора рынка)"""
+        # Одно чтение часов на весь вызов
+        now = datetime.now()
         
-        # Сортируем по убыванию разности цен
-        opportunities.sort(key=lambda x: x.price_difference_percent, reverse=True)
+        opportunities = []
+        if not price_data:
+            self._last_scan = None
+            return opportunities
         
-        # Обновляем статистику
-        self.session_stats['total_opportunities_found'] += len(opportunities)
+        layout = self._layout(price_data)
+        _, order, starts, _, grouped = layout
+        self._last_scan = (price_data, now, layout)
+        
+        # Поиск пар в скомпилированном ядре (поля в порядке символов - непрерывные массивы)
+        threshold = self.config.PRICE_DIFFERENCE_THRESHOLD
+        buy_idx, sell_idx, _ = scan_symbols(
+            np.r_[starts, len(price_data)], np.ascontiguousarray(grouped['ask']), np.ascontiguousarray(grouped['bid']),
+            np.ascontiguousarray(grouped['volume']), np.ascontiguousarray(grouped['timestamp']),
+            np.ascontiguousarray(grouped['exchange']),
+            np.float32(self.config.MIN_VOLUME_USD), np.float32(threshold - _KERNEL_THRESHOLD_SLACK),
+            now.timestamp(), float(MAX_PRICE_AGE_SECONDS)
+        )
+        
+        for buy, sell in zip(order[buy_idx], order[sell_idx]):
+            buy_data = price_data[buy]
+            sell_data = price_data[sell]
+            # Точный спред для отобранных пар считаем в исходной точности
+            price_difference = ((sell_data.bid - buy_data.ask) / buy_data.ask) * 100
+            if price_difference < threshold:
+                continue
+            
+            # Дополнительные проверки
+            if self._is_valid_opportunity(buy_data.symbol, buy_data, sell_data, price_difference):
+                opportunities.append(self._create_opportunity(buy_data, sell_data, price_difference, now))
         
-        self.logger.info(f"Найдено {len(opportunities)} возможностей арбитража")
         return opportunities
     
-    def _analyze_symbol(self, symbol: str, prices: List[PriceData]) -> List[ArbitrageOpportunity]:
-        """Анализ арбитража для конкретного символа"""
-        opportunities = []
+    def _build_overview(self, price_data: List[PriceData], now: datetime, layout: tuple) -> Dict[str, any]:
+        """Обзор рынка по готовой раскладке: спред между крайними ценами символа"""
+        overview = {
+            'timestamp': now,
+            'total_symbols_monitored': 0,
+            'symbols_with_arbitrage': 0,
+            'arbitrage_percentage': 0,
+            'max_spread_found': 0,
+            'best_opportunity': None,
+            'exchanges_data_count': {}
+        }
         
-        # Фильтруем цены с достаточным объемом
-        valid_prices = [
-            p for p in prices 
-            if p.volume_24h >= self.config.MIN_VOLUME_USD
-        ]
+        if not price_data:
+            return overview
         
-        if len(valid_prices) < 2:
-            return opportunities
+        fields, order, starts, sizes, grouped = layout
+        prices = fields['price']
+        sorted_prices = np.ascontiguousarray(grouped['price'])
+        min_prices = np.fmin.reduceat(sorted_prices, starts)
+        max_prices = np.fmax.reduceat(sorted_prices, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            symbol_spreads = (max_prices - min_prices) / min_prices * 100
         
-        # Сортируем по цене
-        valid_prices.sort(key=lambda x: x.ask)
-
-        for i in range(len(valid_prices)):
-            for j in range(i + 1, len(valid_prices)):
-                price_difference = ((valid_prices[j].bid - valid_prices[i].ask) / valid_prices[i].ask) * 100
-
-                if price_difference >= self.config.PRICE_DIFFERENCE_THRESHOLD:
-                    # Дополнительные проверки
-                    if self._is_valid_opportunity(symbol, valid_prices[i], valid_prices[j], price_difference):
-                        opportunity = ArbitrageOpportunity(
-                            symbol=symbol,
-                            buy_exchange=valid_prices[i].exchange,
-                            buy_exchange_networks='Пусто',
-                            sell_exchange=valid_prices[j].exchange,
-                            sell_exchange_networks='Пусто',
-                            buy_price=valid_prices[i].ask,
-                            sell_price=valid_prices[j].bid,
-                            price_difference_percent=price_difference,
-                            min_volume_24h=min(valid_prices[i].volume_24h, valid_prices[j].volume_24h),
-                            timestamp=datetime.now() + timedelta(hours=5)
-                        )
-                        opportunities.append(opportunity)
-                
-                price_difference = ((valid_prices[i].bid - valid_prices[j].ask) / valid_prices[j].ask) * 100
-
-                if price_difference >= self.config.PRICE_DIFFERENCE_THRESHOLD:
-                    # Дополнительные проверки
-                    if self._is_valid_opportunity(symbol, valid_prices[i], valid_prices[j], price_difference):
-                        opportunity = ArbitrageOpportunity(
-                            symbol=symbol,
-                            buy_exchange=valid_prices[j].exchange,
-                            buy_exchange_networks='Пусто',
-                            sell_exchange=valid_prices[i].exchange,
-                            sell_exchange_networks='Пусто',
-                            buy_price=valid_prices[j].ask,
-                            sell_price=valid_prices[i].bid,
-                            price_difference_percent=price_difference,
-                            min_volume_24h=min(valid_prices[i].volume_24h, valid_prices[j].volume_24h),
-                            timestamp=datetime.now() + timedelta(hours=5)
-                        )
-                        opportunities.append(opportunity)
+        # Учитываем только символы минимум с 2 биржами
+        multi = sizes >= 2
+        with_arbitrage = np.flatnonzero(multi & (symbol_spreads >= self.config.PRICE_DIFFERENCE_THRESHOLD))
+        
+        total_symbols = len(starts)
+        overview['total_symbols_monitored'] = total_symbols
+        overview['symbols_with_arbitrage'] = len(with_arbitrage)
+        overview['arbitrage_percentage'] = len(with_arbitrage) / total_symbols * 100
+        
+        if len(with_arbitrage):
+            best = with_arbitrage[np.argmax(symbol_spreads[with_arbitrage])]
+            segment = order[starts[best]:starts[best] + sizes[best]]
+            min_price = price_data[segment[np.nanargmin(prices[segment])]]
+            max_price = price_data[segment[np.nanargmax(prices[segment])]]
+            overview['max_spread_found'] = float(symbol_spreads[best])
+            overview['best_opportunity'] = {
+                'symbol': min_price.symbol,
+                'buy_exchange': min_price.exchange,
+                'sell_exchange': max_price.exchange,
+                'spread': float(symbol_spreads[best])
+            }
+        
+        # Подсчитываем биржи
+        exchange_counts = np.bincount(grouped['exchange'][np.repeat(multi, sizes)],
+                                      minlength=len(self._exchange_names))
+        overview['exchanges_data_count'] = {
+            name: int(count) for name, count in zip(self._exchange_names, exchange_counts) if count
+        }
+        
+        return overview
+    
+    def analyze_arbitrage_opportunities(self, price_data: List[PriceData]) -> List[ArbitrageOpportunity]:
+        """Анализ возможностей арбитража"""
+        opportunities = self._scan(price_data)
+        
+        # Обновляем статистику
+        found = len(opportunities)
+        self.session_stats['total_opportunities_found'] += found
         
+        # Без сортировки: top-k по разности цен выбирает filter_notifications после проверки cooldown
+        
+        self.logger.info(f"Найдено {found} возможностей арбитража")
         return opportunities
     
+    def _create_opportunity(self, buy_data: PriceData, sell_data: PriceData,
+                            price_difference: float, now: datetime) -> ArbitrageOpportunity:
+        """Создание возможности арбитража для пары бирж"""
+        return ArbitrageOpportunity(
+            symbol=buy_data.symbol,
+            buy_exchange=buy_data.exchange,
+            buy_exchange_networks='Пусто',
+            sell_exchange=sell_data.exchange,
+            sell_exchange_networks='Пусто',
+            buy_price=buy_data.ask,
+            sell_price=sell_data.bid,
+            price_difference_percent=price_difference,
+            min_volume_24h=min(buy_data.volume_24h, sell_data.volume_24h),
+            timestamp=now + timedelta(hours=5)
+        )
+    
     def _is_valid_opportunity(self, symbol: str, buy_data: PriceData, sell_data: PriceData, 
                             price_difference: float) -> bool:
         """Валидация возможности арбитража"""
-        
-        # Проверяем что это не одна и та же биржа
-        if buy_data.exchange == sell_data.exchange:
-            return False
-        
-        # Проверяем временные метки (данные не старше 5 минут)
-        # now = datetime.now()
-        # if (now - buy_data.timestamp).seconds > 300 or (now - sell_data.timestamp).seconds > 300:
-        #     return False
+        # Пары одной биржи отсекает ядро scan_symbols (сравнение exchange_ids)
         
         # Проверяем минимальную ликвидность
         # if buy_data.volume_24h < self.config.MIN_VOLUME_USD * 1.5 or sell_data.volume_24h < self.config.MIN_VOLUME_USD * 1.5:
@@ -133,17 +237,32 @@ class ArbitrageAnalyzer:
     
     def filter_notifications(self, opportunities: List[ArbitrageOpportunity]) -> List[ArbitrageOpportunity]:
         """Фильтрация уведомлений (избегаем спам)"""
+        now = time.monotonic()
+        
         # Очищаем старые записи
-        self.notification_manager.cleanup_old_notifications()
+        self.notification_manager.cleanup_old_notifications(now)
         
-        # Фильтруем новые возможности
+        # Сначала отбрасываем пары в cooldown, чтобы они не вытесняли новые возможности из top-k
+        notification_manager = self.notification_manager
         new_opportunities = [
-            opp for opp in opportunities 
-            if self.notification_manager.should_notify(opp)
+            opp for opp in opportunities
+            if not notification_manager.in_cooldown(opp, now)
         ]
         
-        # Ограничиваем количество уведомлений за цикл
-        limited_opportunities = new_opportunities[:self.config.MAX_ALERTS_PER_CYCLE]
+        # Ограничиваем количество уведомлений за цикл: top-k по убыванию разности цен,
+        # частичная сортировка вместо полной
+        k = self.config.MAX_ALERTS_PER_CYCLE
+        found = len(new_opportunities)
+        spreads = np.fromiter((o.price_difference_percent for o in new_opportunities), dtype=np.float64, count=found)
+        top = np.arange(found)
+        if found > k:
+            top = np.argpartition(-spreads, k - 1)[:k] if k > 0 else top[:0]
+        top = top[np.argsort(-spreads[top], kind='stable')]
+        limited_opportunities = [new_opportunities[i] for i in top]
+        
+        # Cooldown запускаем только для действительно отправляемых уведомлений
+        for opp in limited_opportunities:
+            notification_manager.mark_notified(opp, now)
         
         if limited_opportunities:
             self.session_stats['alerts_sent'] += len(limited_opportunities)
@@ -152,53 +271,17 @@ class ArbitrageAnalyzer:
     
     def get_market_overview(self, price_data: List[PriceData]) -> Dict[str, any]:
         """Обзор рынка"""
-        # Группируем по символам
-        symbols_data = defaultdict(list)
-        for price in price_data:
-            symbols_data[price.symbol].append(price)
-        
-        total_symbols = len(symbols_data)
-        symbols_with_arbitrage = 0
-        max_spread = 0
-        best_opportunity = None
-        exchange_counts = defaultdict(int)
-        
-        for symbol, prices in symbols_data.items():
-            if len(prices) < 2:
-                continue
-                
-            # Подсчитываем биржи
-            for price in prices:
-                exchange_counts[price.exchange] += 1
-            
-            # Находим спред
-            min_price = min(prices, key=lambda x: x.price)
-            max_price = max(prices, key=lambda x: x.price)
-            spread = ((max_price.price - min_price.price) / min_price.price) * 100
-            
-            if spread >= self.config.PRICE_DIFFERENCE_THRESHOLD:
-                symbols_with_arbitrage += 1
-                
-                if spread > max_spread:
-                    max_spread = spread
-                    best_opportunity = {
-                        'symbol': symbol,
-                        'buy_exchange': min_price.exchange,
-                        'sell_exchange': max_price.exchange,
-                        'spread': spread
-                    }
-        
-        return {
-            'timestamp': datetime.now(),
-            'total_symbols_monitored': total_symbols,
-            'symbols_with_arbitrage': symbols_with_arbitrage,
-            'arbitrage_percentage': (symbols_with_arbitrage / total_symbols * 100) if total_symbols > 0 else 0,
-            'max_spread_found': max_spread,
-            'best_opportunity': best_opportunity,
-            'exchanges_data_count': dict(exchange_counts),
-            'session_stats': self.session_stats.copy(),
-            'notification_stats': self.notification_manager.get_stats()
-        }
+        # Обзор считается только по запросу: для данных последнего анализа раскладка переиспользуется,
+        # иначе строится заново (без ядра поиска пар)
+        last_scan = self._last_scan
+        if last_scan is not None and last_scan[0] is price_data:
+            overview = self._build_overview(*last_scan)
+        else:
+            layout = self._layout(price_data) if price_data else None
+            overview = self._build_overview(price_data, datetime.now(), layout)
+        overview['session_stats'] = self.session_stats.copy()
+        overview['notification_stats'] = self.notification_manager.get_stats()
+        return overview
     
     def update_session_stats(self):
         """Обновление статистики сессии"""
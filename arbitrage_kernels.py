@@ -0,0 +1,87 @@
+# arbitrage_kernels.py - Numba-ядра для поиска арбитража по массивам цен
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def counting_sort(ids, n_ids):
+    """Устойчивая сортировка подсчетом по id группы.
+
+    Возвращает порядок индексов и начала групп (n_ids + 1 элемент, пустые группы допускаются).
+    """
+    # Первый проход: размеры групп
+    counts = np.zeros(n_ids, np.int64)
+    for i in range(len(ids)):
+        counts[ids[i]] += 1
+
+    starts = np.zeros(n_ids + 1, np.int64)
+    starts[1:] = np.cumsum(counts)
+
+    # Второй проход: раскладываем индексы по своим группам
+    cursor = starts[:-1].copy()
+    order = np.empty(len(ids), np.int64)
+    for i in range(len(ids)):
+        order[cursor[ids[i]]] = i
+        cursor[ids[i]] += 1
+
+    return order, starts
+
+
+@njit(cache=True)
+def _pair_spread(i, j, asks, bids, volumes, timestamps, exchange_ids, min_volume, now, max_age):
+    """Спред покупки на i и продажи на j в процентах (NaN если пара невалидна)"""
+    if exchange_ids[i] == exchange_ids[j]:
+        return np.float32(np.nan)
+    if volumes[i] < min_volume or volumes[j] < min_volume:
+        return np.float32(np.nan)
+    if now - timestamps[i] > max_age or now - timestamps[j] > max_age:
+        return np.float32(np.nan)
+    if not asks[i] > 0:
+        return np.float32(np.nan)
+    return (bids[j] - asks[i]) / asks[i] * np.float32(100)
+
+
+@njit(parallel=True, cache=True)
+def scan_symbols(starts, asks, bids, volumes, timestamps, exchange_ids,
+                 min_volume, threshold, now, max_age):
+    """Поиск пар бирж со спредом не ниже порога внутри каждого сегмента символа.
+
+    Массивы упорядочены по символам, сегмент seg занимает [starts[seg], starts[seg + 1]).
+    Цены и объемы во float32, временные метки во float64 (epoch секунды).
+    Сегменты обрабатываются параллельно: каждый пишет только в свою область результатов.
+    Возвращает индексы покупки, продажи и спреды найденных пар.
+    """
+    n_segments = len(starts) - 1
+
+    # Первый проход: считаем пары в каждом сегменте
+    counts = np.zeros(n_segments, np.int64)
+    for seg in prange(n_segments):
+        lo, hi = starts[seg], starts[seg + 1]
+        for i in range(lo, hi):
+            for j in range(lo, hi):
+                spread = _pair_spread(i, j, asks, bids, volumes, timestamps, exchange_ids,
+                                      min_volume, now, max_age)
+                if spread >= threshold:
+                    counts[seg] += 1
+
+    offsets = np.zeros(n_segments + 1, np.int64)
+    offsets[1:] = np.cumsum(counts)
+    buy_idx = np.empty(offsets[-1], np.int64)
+    sell_idx = np.empty(offsets[-1], np.int64)
+    spreads = np.empty(offsets[-1], np.float32)
+
+    # Второй проход: записываем пары по смещениям сегментов
+    for seg in prange(n_segments):
+        lo, hi = starts[seg], starts[seg + 1]
+        k = offsets[seg]
+        for i in range(lo, hi):
+            for j in range(lo, hi):
+                spread = _pair_spread(i, j, asks, bids, volumes, timestamps, exchange_ids,
+                                      min_volume, now, max_age)
+                if spread >= threshold:
+                    buy_idx[k] = i
+                    sell_idx[k] = j
+                    spreads[k] = spread
+                    k += 1
+
+    return buy_idx, sell_idx, spreads
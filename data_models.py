@@ -1,9 +1,11 @@
 # data_models.py - Простые модели данных без базы данных
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+import heapq
+import time
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PriceData:
     symbol: str
     exchange: str
@@ -11,12 +13,12 @@ class PriceData:
     bid: float
     ask: float
     volume_24h: float
-    timestamp: datetime
+    timestamp: float  # epoch секунды (time.time())
     
     def __str__(self):
         return f"{self.symbol} на {self.exchange}: ${self.price:.6f} (${self.volume_24h:,.0f})"
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ArbitrageOpportunity:
     symbol: str
     buy_exchange: str
@@ -28,6 +30,14 @@ class ArbitrageOpportunity:
     price_difference_percent: float
     min_volume_24h: float
     timestamp: datetime
+    # Базовая и котируемая валюты: символ разбирается один раз при создании (нужны для запроса сетей)
+    base: str = field(init=False, repr=False, compare=False)
+    quote: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        base, _, quote = self.symbol.partition('/')
+        object.__setattr__(self, 'base', base)
+        object.__setattr__(self, 'quote', quote)
     
     def profit_estimation(self, trade_amount_usd: float = 1000) -> Dict[str, float]:
         """Быстрый расчет потенциальной прибыли"""
@@ -53,38 +63,52 @@ class ArbitrageOpportunity:
 # Простой менеджер уведомлений в памяти
 class NotificationManager:
     def __init__(self, cooldown_minutes: int = 30):
-        self.last_notifications: Dict[str, datetime] = {}
+        # Время последнего уведомления (monotonic секунды) по (символ, биржа покупки, биржа продажи)
+        self.last_notifications: Dict[Tuple[str, str, str], float] = {}
+        # Куча (время истечения, ключ); устаревшие элементы отбрасываются лениво
+        self._expiry_heap: List[Tuple[float, Tuple[str, str, str]]] = []
         self.cooldown_minutes = cooldown_minutes
+        self.retention_seconds = 2 * cooldown_minutes * 60  # Храним записи два периода ожидания
     
-    def should_notify(self, opportunity: ArbitrageOpportunity) -> bool:
+    def should_notify(self, opportunity: ArbitrageOpportunity, now: Optional[float] = None) -> bool:
         """Проверяет нужно ли отправлять уведомление"""
-        key = f"{opportunity.symbol}_{opportunity.buy_exchange}_{opportunity.sell_exchange}"
-        last_time = self.last_notifications.get(key)
+        if now is None:
+            now = time.monotonic()
         
-        if last_time is None:
-            self.last_notifications[key] = datetime.now()
-            return True
+        if self.in_cooldown(opportunity, now):
+            return False
         
-        # Проверяем прошло ли достаточно времени
-        time_diff = (datetime.now() - last_time).total_seconds() / 60
-        if time_diff >= self.cooldown_minutes:
-            self.last_notifications[key] = datetime.now()
-            return True
+        self.mark_notified(opportunity, now)
+        return True
+    
+    def in_cooldown(self, opportunity: ArbitrageOpportunity, now: float) -> bool:
+        """Уведомление по паре бирж уже было в пределах периода ожидания"""
+        key = (opportunity.symbol, opportunity.buy_exchange, opportunity.sell_exchange)
+        last_time = self.last_notifications.get(key)
         
-        return False
+        # Проверяем прошло ли достаточно времени
+        return last_time is not None and now - last_time < self.cooldown_minutes * 60
+    
+    def mark_notified(self, opportunity: ArbitrageOpportunity, now: float):
+        """Запоминает время отправленного уведомления"""
+        key = (opportunity.symbol, opportunity.buy_exchange, opportunity.sell_exchange)
+        self.last_notifications[key] = now
+        heapq.heappush(self._expiry_heap, (now + self.retention_seconds, key))
     
-    def cleanup_old_notifications(self):
+    def cleanup_old_notifications(self, now: Optional[float] = None):
         """Очищает старые записи"""
-        cutoff_time = datetime.now()
-        keys_to_remove = []
+        if now is None:
+            now = time.monotonic()
         
-        for key, timestamp in self.last_notifications.items():
-            time_diff = (cutoff_time - timestamp).total_seconds() / 3600  # часы
-            if time_diff > 4:  # Удаляем записи старше 4 часов
-                keys_to_remove.append(key)
+        cutoff_time = now - self.retention_seconds
+        heap = self._expiry_heap
         
-        for key in keys_to_remove:
-            del self.last_notifications[key]
+        # Снимаем только истекшие элементы; запись удаляем, если ее не обновили позже
+        while heap and heap[0][0] < now:
+            _, key = heapq.heappop(heap)
+            timestamp = self.last_notifications.get(key)
+            if timestamp is not None and timestamp < cutoff_time:
+                del self.last_notifications[key]
     
     def get_stats(self) -> Dict[str, int]:
         """Получение статистики уведомлений"""
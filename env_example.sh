@@ -6,6 +6,7 @@
 
 # Telegram бот (ОБЯЗАТЕЛЬНО!)
 TELEGRAM_BOT_TOKEN=1234567890:ABCdefGHIjklMNOpqrsTUVwxyz
+# Можно несколько чатов через запятую: 123456789,987654321
 TELEGRAM_CHAT_ID=123456789
 
 # =============================================================================
@@ -27,6 +28,16 @@ MAX_ALERTS=5
 # Cooldown между повторными уведомлениями (в минутах)
 ALERT_COOLDOWN=30
 
+# Максимум одновременных HTTP запросов к биржам
+MAX_CONCURRENT_REQUESTS=16
+
+# Время жизни кэша тикеров и рынков бирж (в секундах)
+TICKER_TTL_SECONDS=5
+MARKETS_TTL_SECONDS=3600
+
+# Цены по WebSocket вместо REST опроса (true/false)
+USE_WEBSOCKETS=false
+
 # =============================================================================
 # API КЛЮЧИ БИРЖ (ОПЦИОНАЛЬНО)
 # =============================================================================
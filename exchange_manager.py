@@ -1,86 +1,176 @@
-import ccxt
+import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
+import aiohttp
 import asyncio
-from typing import Dict, List, Optional
-from datetime import datetime
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+import heapq
 import logging
+import re
+import time
+from operator import itemgetter
+import orjson
 from data_models import PriceData
 from telegram_notifier import TelegramNotifier
 from arbitrage_analyzer import ArbitrageAnalyzer
 
+# Признаки деривативов в названии символа (PERP, SWAP, FUTURE, '-' покрывает USDT- и BUSD-)
+_DERIVATIVE_RE = re.compile(r'PERP|SWAP|FUTURE|-')
+
+# Допустимые котируемые валюты
+_ALLOWED_QUOTES = frozenset({'USDT', 'USDC', 'BTC', 'ETH', 'BNB'})
+
+# Лимиты общего пула соединений (всего и на один хост биржи)
+_CONNECTOR_LIMIT = 2000
+_CONNECTOR_LIMIT_PER_HOST = 100
+
+
+def create_http_session() -> aiohttp.ClientSession:
+    """Общая HTTP сессия: один TCP коннектор с keep-alive и DNS кэшем (создавать внутри event loop)"""
+    connector = aiohttp.TCPConnector(limit=_CONNECTOR_LIMIT,
+                                     limit_per_host=_CONNECTOR_LIMIT_PER_HOST,
+                                     ttl_dns_cache=300)
+    # JSON тела запросов через orjson (aiohttp ждет str, orjson возвращает bytes)
+    return aiohttp.ClientSession(connector=connector,
+                                 json_serialize=lambda obj: orjson.dumps(obj).decode())
+
+
+class AdmissionController:
+    """Допуск одновременных запросов к биржам с изменяемым лимитом (условие + счетчик).
+
+    При RateLimitExceeded (429) лимит уменьшается вдвое, после серии успешных
+    запросов восстанавливается по одному до значения из конфигурации.
+    """
+
+    def __init__(self, limit: int):
+        self.logger = logging.getLogger(__name__)
+        self._limit = limit
+        self._max = limit
+        self._active = 0
+        self._successes = 0
+        self._cv = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cv:
+            await self._cv.wait_for(lambda: self._active < self._max)
+            self._active += 1
+
+    async def release(self, rate_limited: bool = False):
+        # Слот и лимит меняем до первого await: отмена во время ожидания блокировки не теряет слот
+        self._active -= 1
+        if rate_limited:
+            self._successes = 0
+            self._set_max(self._max // 2)
+            self.logger.warning(f"Превышен лимит запросов биржи, конкурентность снижена до {self._max}")
+        elif self._max < self._limit:
+            self._successes += 1
+            if self._successes >= self._max:
+                self._successes = 0
+                self._set_max(self._max + 1)
+        
+        # Будим ожидающих даже при отмене вызывающей задачи
+        await asyncio.shield(self._notify())
+
+    async def _notify(self):
+        async with self._cv:
+            self._cv.notify_all()
+
+    def _set_max(self, limit: int):
+        self._max = max(1, min(limit, self._limit))
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release(rate_limited=exc_type is not None and issubclass(exc_type, ccxt.RateLimitExceeded))
+
 class ExchangeManager:
-    def __init__(self, config):
+    def __init__(self, config, session: Optional[aiohttp.ClientSession] = None):
         self.config = config
         self.exchanges = {}
         self.logger = logging.getLogger(__name__)
         
-    async def initialize_exchanges(self):
-        semaphore = asyncio.Semaphore(8)  # Максимум 8 одновременных запросов
-        tasks = []
+        # Кэш тикеров: (биржа, символ) -> (monotonic время, данные или None)
+        self._ticker_cache: Dict[Tuple[str, str], Tuple[float, Optional[PriceData]]] = {}
+        
+        # Время последней загрузки рынков по биржам (monotonic) и фоновые задачи загрузки
+        self._markets_loaded_at: Dict[str, float] = {}
+        self._market_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Валидные спот символы бирж (пересчитываются после загрузки рынков)
+        self._valid_symbols: Dict[str, frozenset] = {}
+        
+        # Кэш сетей вывода: (биржа, монета) -> активные сети с комиссией
+        self._currency_cache: Dict[Tuple[str, str], Tuple[Tuple[str, Optional[float]], ...]] = {}
+        
+        # Общий лимит одновременных запросов к биржам (снижается при 429)
+        self._admission = AdmissionController(config.MAX_CONCURRENT_REQUESTS)
+        
+        # Ограниченная очередь уведомлений между сбором цен и отправкой в Telegram
+        self._alert_queue: asyncio.Queue = asyncio.Queue(maxsize=32)
+        self._alert_consumer: Optional[asyncio.Task] = None
+        
+        # Живые цены из WebSocket подписок: (биржа, символ) -> PriceData
+        self._live_prices: Dict[Tuple[str, str], PriceData] = {}
+        self._watchers: Dict[str, asyncio.Task] = {}
+        self._watch_symbols: List[str] = []
+        
+        # Общая HTTP сессия всех бирж: переданная извне, либо своя (создается в initialize_exchanges)
+        self._session = session
+        self._owns_session = session is None
+        
+    async def initialize_exchanges(self) -> Dict[str, asyncio.Task]:
+        """Однократное создание экземпляров бирж и запуск первой загрузки рынков"""
+        # Одна сессия и TCP коннектор на все биржи: keep-alive и DNS кэш общие
+        if self._session is None:
+            self._session = create_http_session()
 
         for exchange_name in self.config.EXCHANGES:
-            exchange_class = getattr(ccxt, exchange_name)
+            # С WebSocket берем класс ccxt.pro (он же умеет и REST запросы)
+            if self.config.USE_WEBSOCKETS and hasattr(ccxtpro, exchange_name):
+                exchange_class = getattr(ccxtpro, exchange_name)
+            else:
+                exchange_class = getattr(ccxt, exchange_name)
             credentials = self.config.EXCHANGE_CREDENTIALS.get(exchange_name, {})
-            print(credentials)
             
             exchange = exchange_class({
                 **credentials,
                 'enableRateLimit': True,
                 'timeout': 30000,
+                'session': self._session,
             })
 
-            print(exchange_name)
+            self.logger.debug(f"Инициализация биржи {exchange_name}")
+
+            # Разбор JSON ответов через orjson (проверку формата оставляет parse_json ccxt)
+            exchange.on_json_response = orjson.loads
 
             self.exchanges[exchange_name] = exchange
 
-        for exchange_name in self.exchanges.keys():
-            exchange = self.exchanges.get(exchange_name)
-            task = self.load_markets(exchange_name)
-            tasks.append(task)
-        
-        async def limited_fetch(task):
-            async with semaphore:
-                try:
-                    return await task
-                except Exception as e:
-                    self.logger.error(f"Ошибка инициализации биржи {task}: {e}")
-        
-        results = await asyncio.gather(*[limited_fetch(task) for task in tasks], 
-                                    return_exceptions=True)
+        return self.refresh_markets()
 
-        # print(len(results))
+    def refresh_markets(self) -> Dict[str, asyncio.Task]:
+        """Фоновая загрузка рынков бирж, у которых кэш рынков устарел (или еще не загружен).
 
-        # """Инициализация всех бирж"""
-        # for exchange_name in self.config.EXCHANGES:
-        #     try:
-        #         exchange_class = getattr(ccxt, exchange_name)
-        #         credentials = self.config.EXCHANGE_CREDENTIALS.get(exchange_name, {})
-                
-        #         exchange = exchange_class({
-        #             **credentials,
-        #             'enableRateLimit': True,
-        #             'timeout': 30000,
-        #         })
-                
-        #         # Проверка подключения с правильной обработкой sync/async
-        #         if hasattr(exchange, 'fetch_currencies'):
-        #             try:
-        #                 if asyncio.iscoroutinefunction(exchange.fetch_currencies):
-        #                     await exchange.fetch_currencies()
-        #                 else:
-        #                     # Запускаем синхронный метод в отдельном потоке
-        #                     loop = asyncio.get_event_loop()
-        #                     await loop.run_in_executor(None, exchange.fetch_currencies)
-                        
-        #                 self.exchanges[exchange_name] = exchange
-        #                 self.logger.info(f"Биржа {exchange_name} инициализирована успешно")
-        #             except Exception as load_error:
-        #                 self.logger.warning(f"Не удалось загрузить рынки для {exchange_name}: {load_error}")
-        #                 # Продолжаем без загрузки рынков
-                
-        #     except Exception as e:
-        #         self.logger.error(f"Ошибка инициализации биржи {exchange_name}: {e}")
-                
-        # self.logger.info(f"Инициализировано {len(self.exchanges)} бирж")
+        Не ждет завершения: запросы к бирже сначала дожидаются только ее загрузки
+        (_wait_markets), поэтому быстрые биржи начинают сбор цен раньше медленных.
+        """
+        now = time.monotonic()
+        for exchange_name in self.exchanges.keys():
+            task = self._market_tasks.get(exchange_name)
+            if task is not None and not task.done():
+                continue
+            if now - self._markets_loaded_at.get(exchange_name, -float('inf')) >= self.config.MARKETS_TTL_SECONDS:
+                self._market_tasks[exchange_name] = asyncio.create_task(self.load_markets(exchange_name))
+        
+        return self._market_tasks
+    
+    async def _wait_markets(self, exchange_name: str):
+        """Ожидание загрузки рынков биржи (ошибки загрузки логирует load_markets)"""
+        task = self._market_tasks.get(exchange_name)
+        if task is not None:
+            await task
     
     async def load_markets(self, exchange_name: str) -> dict:
         """Получение данных load_markets с биржи"""
@@ -92,45 +182,54 @@ class ExchangeManager:
             # Проверяем есть ли метод load_markets
             if not hasattr(exchange, 'load_markets'):
                 return None
-                
-            # Определяем синхронный или асинхронный метод
-            if asyncio.iscoroutinefunction(exchange.load_markets):
-                data = await exchange.load_markets()
-            else:
-                print(exchange_name)
-                # Запускаем синхронный метод в отдельном потоке
-                loop = asyncio.get_event_loop()
-                data = await loop.run_in_executor(None, exchange.load_markets) 
             
-            return data
+            # Повторная загрузка обновляет рынки и валюты, сети перечитываются из них заново
+            reload = exchange_name in self._markets_loaded_at
+            async with self._admission:
+                markets = await exchange.load_markets(reload)
+            self._markets_loaded_at[exchange_name] = time.monotonic()
+            self._valid_symbols.pop(exchange_name, None)
+            for key in [key for key in self._currency_cache if key[0] == exchange_name]:
+                del self._currency_cache[key]
+            return markets
             
         except Exception as e:
-            self.logger.warning(f"Ошибка получения тикера {symbol} с {exchange_name}: {e}")
+            self.logger.warning(f"Ошибка загрузки рынков с {exchange_name}: {e}")
             return None
     
     async def get_all_symbols(self) -> List[str]:
-        """Получение списка всех символов доступных на биржах"""
-        all_symbols = set()
+        """Получение списка всех символов доступных на биржах (в порядке первого появления)"""
+        # dict как упорядоченное множество: дедупликация без сортировки
+        all_symbols: Dict[str, None] = {}
         
         for exchange_name, exchange in self.exchanges.items():
             try:
                 markets = exchange.markets
-                self.logger.error(f"{exchange.name}: {markets}")
-                for symbol in markets:
-                    if self._is_valid_symbol(symbol, markets[symbol]):
-                        all_symbols.add(symbol)
+                self.logger.debug(f"{exchange.name}: {len(markets)} рынков")
+                all_symbols.update(dict.fromkeys(
+                    symbol for symbol, market in markets.items() if self._is_valid_symbol(symbol, market)
+                ))
                         
             except Exception as e:
                 self.logger.error(f"Ошибка получения символов с {exchange_name}: {e}")
         
-        # Исключаем топ монеты и стейблкоины
+        # Исключаем топ монеты и стейблкоины (по базовой валюте)
         filtered_symbols = [
             symbol for symbol in all_symbols 
-            if not any(excluded in symbol for excluded in self.config.EXCLUDED_SYMBOLS)
+            if symbol.split('/', 1)[0] not in self.config.EXCLUDED_SYMBOLS_SET
         ]
         
         self.logger.info(f"Найдено {len(filtered_symbols)} символов для мониторинга")
-        return sorted(filtered_symbols)
+        return filtered_symbols
+    
+    def _valid_symbol_set(self, exchange_name: str) -> frozenset:
+        """Множество валидных символов биржи, один расчет на загрузку рынков"""
+        valid = self._valid_symbols.get(exchange_name)
+        if valid is None:
+            markets = self.exchanges[exchange_name].markets or {}
+            valid = frozenset(symbol for symbol, market in markets.items() if self._is_valid_symbol(symbol, market))
+            self._valid_symbols[exchange_name] = valid
+        return valid
     
     def _is_valid_symbol(self, symbol: str, market: dict) -> bool:
         """Проверка валидности символа для торговли"""
@@ -144,17 +243,16 @@ class ExchangeManager:
                 return False
                 
             # Проверяем что это не фьючерс или опцион
-            if any(keyword in symbol.upper() 
-                   for keyword in ['PERP', 'SWAP', 'FUTURE', '-', 'USDT-', 'BUSD-']):
+            if _DERIVATIVE_RE.search(symbol.upper()):
                 return False
                 
             # Проверяем базовую валюту (исключаем фиатные пары)
             quote = market.get('quote', '').upper()
-            if quote not in ['USDT', 'USDC', 'BTC', 'ETH', 'BNB']:
+            if quote not in _ALLOWED_QUOTES:
                 return False
             
             if 'USDT' not in symbol:
-            	return False
+                return False
             
             if 'USD' in symbol.split('/')[0]:
                 return False
@@ -171,22 +269,61 @@ class ExchangeManager:
         if not exchange:
             return None 
         
-        currency_info = exchange.currency(currency)
-
-        if currency_info and 'networks' in currency_info:
-            for network, data in currency_info['networks'].items():
-                if data['active'] == True:
-                    networks += f"\n{network}"
-                    if data['fee'] != None:
-                        networks += f", Комиссия: {round(data['fee'] * price, 2)} USDT\n"
+        # Сети монеты меняются только с перезагрузкой рынков - читаем их один раз
+        key = (exchange_name, currency)
+        active_networks = self._currency_cache.get(key)
+        if active_networks is None:
+            currency_info = exchange.currency(currency)
+            active_networks = ()
+            if currency_info and 'networks' in currency_info:
+                active_networks = tuple(
+                    (network, data['fee'])
+                    for network, data in currency_info['networks'].items()
+                    if data['active'] == True
+                )
                 # networks += f"Withdraw Enabled: {data['withdraw']}\n"
                 # networks += f"Deposit Enabled: {data['deposit']}\n"
+            self._currency_cache[key] = active_networks
+
+        for network, fee in active_networks:
+            networks += f"\n{network}"
+            if fee != None:
+                networks += f", Комиссия: {round(fee * price, 2)} USDT\n"
         
         if networks == '':
             networks = 'Пусто'
             
         return networks
             
+    def _price_from_ticker(self, exchange_name: str, symbol: str, ticker: dict, timestamp: float) -> Optional[PriceData]:
+        """Преобразование тикера ccxt в PriceData (None если объем ниже минимума или нет цены)"""
+        # Проверяем минимальный объем торгов
+        volume_usd = ticker.get('quoteVolume') or 0.0
+        if volume_usd < self.config.MIN_VOLUME_USD:
+            return None
+        
+        # Некоторые биржи отдают last=None при валидных bid/ask - такой тикер в анализ не берем
+        last = ticker.get('last')
+        if last is None or last <= 0:
+            return None
+            
+        return PriceData(
+            symbol=symbol,
+            exchange=exchange_name,
+            price=last,
+            bid=ticker['bid'],
+            ask=ticker['ask'],
+            volume_24h=volume_usd,
+            timestamp=timestamp
+        )
+    
+    def _get_cached_ticker(self, exchange_name: str, symbol: str, now: float) -> Tuple[bool, Optional[PriceData]]:
+        """Свежая запись кэша тикеров: (найдено, данные)"""
+        cached = self._ticker_cache.get((exchange_name, symbol))
+        if cached is not None and now - cached[0] < self.config.TICKER_TTL_SECONDS:
+            return True, cached[1]
+        return False, None
+    
     async def fetch_ticker_data(self, exchange_name: str, symbol: str) -> Optional[PriceData]:
         """Получение данных тикера с биржи"""
         try:
@@ -198,74 +335,197 @@ class ExchangeManager:
             # Проверяем есть ли метод fetch_ticker
             if not hasattr(exchange, 'fetch_ticker'):
                 return None
+            
+            # Повторный запрос в пределах TTL отдаем из кэша
+            now = time.monotonic()
+            found, price_data = self._get_cached_ticker(exchange_name, symbol, now)
+            if found:
+                return price_data
                 
-            # Определяем синхронный или асинхронный метод
-            if asyncio.iscoroutinefunction(exchange.fetch_ticker):
+            async with self._admission:
                 ticker = await exchange.fetch_ticker(symbol)
-            else:
-                # Запускаем синхронный метод в отдельном потоке
-                loop = asyncio.get_event_loop()
-                ticker = await loop.run_in_executor(None, exchange.fetch_ticker, symbol) 
             
             # self.logger.info(f"Данные с тикера {symbol} {exchange_name} {ticker}")
             
-            # Проверяем минимальный объем торгов
-            volume_usd = ticker.get('quoteVolume', 0) or 0
-            if volume_usd < self.config.MIN_VOLUME_USD:
-                return None
-                
-            return PriceData(
-                symbol=symbol,
-                exchange=exchange_name,
-                price=ticker['last'],
-                bid=ticker['bid'],
-                ask=ticker['ask'],
-                volume_24h=volume_usd,
-                timestamp=datetime.now()
-            )
+            price_data = self._price_from_ticker(exchange_name, symbol, ticker, time.time())
+            self._ticker_cache[(exchange_name, symbol)] = (now, price_data)
+            return price_data
             
         except Exception as e:
             self.logger.warning(f"Ошибка получения тикера {symbol} с {exchange_name}: {e}")
             return None
     
-    async def fetch_all_tickers(self, symbols: List[str], telegram_notifier: TelegramNotifier, arbitrage_analyzer: ArbitrageAnalyzer):
-        """Получение всех тикеров со всех бирж"""
-        
-        # Создаем задачи для параллельного выполнения
-        for symbol in symbols:
-            tasks = []
-            all_price_data = []
-             # Выполняем все запросы параллельно с ограничением
-            semaphore = asyncio.Semaphore(8)  # Максимум 8 одновременных запросов
+    async def fetch_exchange_tickers(self, exchange_name: str, symbols: List[str]) -> List[PriceData]:
+        """Получение тикеров всех символов с биржи одним запросом"""
+        try:
+            exchange = self.exchanges.get(exchange_name)
+            if not exchange:
+                return []
+            
+            await self._wait_markets(exchange_name)
+            
+            # Запрашиваем только символы, которые торгуются на бирже
+            markets = exchange.markets or {}
+            exchange_symbols = [symbol for symbol in symbols if symbol in markets]
+            if not exchange_symbols:
+                return []
 
-            for exchange_name in self.exchanges.keys():
-                task = self.fetch_ticker_data(exchange_name, symbol)
-                tasks.append(task)
+            # При активной подписке берем живые цены; символы, по которым WebSocket ничего не прислал
+            # или прислал дольше TICKER_TTL_SECONDS назад (тихий символ, зависшее соединение), - через REST
+            if exchange_name in self._watchers:
+                live = []
+                missing = []
+                fresh_after = time.time() - self.config.TICKER_TTL_SECONDS
+                for symbol in exchange_symbols:
+                    price_data = self._live_prices.get((exchange_name, symbol))
+                    if price_data is not None and price_data.timestamp >= fresh_after:
+                        live.append(price_data)
+                    else:
+                        missing.append(symbol)
+                if not missing:
+                    return live
+                return live + await self._fetch_rest_tickers(exchange_name, exchange, missing)
             
-            async def limited_fetch(task):
-                async with semaphore:
-                    return await task
+            return await self._fetch_rest_tickers(exchange_name, exchange, exchange_symbols)
             
-            results = await asyncio.gather(*[limited_fetch(task) for task in tasks], 
-                                        return_exceptions=True)
+        except Exception as e:
+            self.logger.warning(f"Ошибка получения тикеров с {exchange_name}: {e}")
+            return []
+    
+    async def _fetch_rest_tickers(self, exchange_name: str, exchange, exchange_symbols: List[str]) -> List[PriceData]:
+        """Тикеры символов через REST: пакетный fetchTickers (с кэшем) или запросы по символу"""
+        # Биржи без пакетного fetchTickers опрашиваем по символу (в пределах общего лимита запросов)
+        if not exchange.has.get('fetchTickers'):
+            results = await asyncio.gather(
+                *(self.fetch_ticker_data(exchange_name, symbol) for symbol in exchange_symbols)
+            )
+            return [price_data for price_data in results if price_data is not None]
+
+        # Если весь пакет свежий в кэше - запрос не нужен
+        now = time.monotonic()
+        cached = [self._get_cached_ticker(exchange_name, symbol, now) for symbol in exchange_symbols]
+        if all(found for found, _ in cached):
+            return [price_data for _, price_data in cached if price_data is not None]
+        
+        async with self._admission:
+            tickers = await exchange.fetch_tickers(exchange_symbols)
+        
+        # Одна временная метка на весь ответ биржи
+        timestamp = time.time()
+        result = []
+        for symbol in exchange_symbols:
+            ticker = tickers.get(symbol)
+            if not ticker:
+                continue
             
-            # Фильтруем успешные результаты
-            for result in results:
-                if isinstance(result, PriceData):
-                    all_price_data.append(result)
+            price_data = self._price_from_ticker(exchange_name, symbol, ticker, timestamp)
+            self._ticker_cache[(exchange_name, symbol)] = (now, price_data)
+            if price_data is not None:
+                result.append(price_data)
+        
+        return result
+    
+    def _start_watchers(self, symbols: List[str]):
+        """Запуск WebSocket подписок на тикеры для бирж с watchTickers (список символов обновляется)"""
+        self._watch_symbols = symbols
+        for exchange_name, exchange in self.exchanges.items():
+            task = self._watchers.get(exchange_name)
+            if (task is None or task.done()) and exchange.has.get('watchTickers'):
+                self._watchers[exchange_name] = asyncio.create_task(self._watch_tickers(exchange_name))
+    
+    async def _watch_tickers(self, exchange_name: str):
+        """Цикл подписки: каждое обновление тикеров кладем в словарь живых цен"""
+        exchange = self.exchanges[exchange_name]
+        while True:
+            markets = exchange.markets or {}
+            symbols = [symbol for symbol in self._watch_symbols if symbol in markets]
+            if not symbols:
+                await asyncio.sleep(1)
+                continue
             
-            opportunities = arbitrage_analyzer.analyze_arbitrage_opportunities(
-                    all_price_data)
+            try:
+                tickers = await exchange.watch_tickers(symbols)
+            except Exception as e:
+                self.logger.warning(f"Ошибка подписки на тикеры {exchange_name}: {e}")
+                await asyncio.sleep(5)
+                continue
             
-            for opp in opportunities: 
-                opp.buy_exchange_networks = await self.get_currency_networks(opp.buy_exchange, opp.symbol.split('/')[0], opp.buy_price)
-                opp.sell_exchange_networks = await self.get_currency_networks(opp.sell_exchange, opp.symbol.split('/')[0], opp.sell_price)
-
-            self.logger.info(f"Найдено {len(opportunities)} возможностей для {symbol}")
-
-            await telegram_notifier.send_arbitrage_alerts(opportunities)
-
-        return
+            timestamp = time.time()
+            for symbol, ticker in tickers.items():
+                price_data = self._price_from_ticker(exchange_name, symbol, ticker, timestamp)
+                if price_data is not None:
+                    self._live_prices[(exchange_name, symbol)] = price_data
+                else:
+                    self._live_prices.pop((exchange_name, symbol), None)
+    
+    async def fetch_all_tickers(self, symbols: List[str], telegram_notifier: TelegramNotifier, arbitrage_analyzer: ArbitrageAnalyzer):
+        """Получение всех тикеров со всех бирж"""
+        
+        if self.config.USE_WEBSOCKETS:
+            self._start_watchers(symbols)
+        
+        # Один пакетный запрос на биржу, биржи опрашиваются параллельно
+        results = await asyncio.gather(
+            *[self.fetch_exchange_tickers(exchange_name, symbols) for exchange_name in self.exchanges.keys()],
+            return_exceptions=True
+        )
+        
+        # Фильтруем успешные результаты
+        all_price_data = []
+        for result in results:
+            if isinstance(result, list):
+                all_price_data.extend(result)
+        
+        opportunities = arbitrage_analyzer.analyze_arbitrage_opportunities(all_price_data)
+        
+        self.logger.info(f"Найдено {len(opportunities)} возможностей для {len(symbols)} символов")
+        
+        # Не повторяем уведомления по той же паре бирж в пределах ALERT_COOLDOWN_MINUTES
+        opportunities = arbitrage_analyzer.filter_notifications(opportunities)
+        
+        if not opportunities:
+            return
+        
+        # Сети и отправку в Telegram выполняет потребитель очереди, пока идет следующий цикл сбора
+        if self._alert_consumer is None or self._alert_consumer.done():
+            self._alert_consumer = asyncio.create_task(self._consume_alerts(telegram_notifier))
+        await self._alert_queue.put(opportunities)
+    
+    async def _consume_alerts(self, telegram_notifier: TelegramNotifier):
+        """Потребитель очереди уведомлений: дополняет возможности сетями и отправляет их"""
+        while True:
+            opportunities = await self._alert_queue.get()
+            try:
+                # Сети покупки и продажи всех возможностей запрашиваем одновременно
+                coros = []
+                for opp in opportunities:
+                    coros.append(self.get_currency_networks(opp.buy_exchange, opp.base, opp.buy_price))
+                    coros.append(self.get_currency_networks(opp.sell_exchange, opp.base, opp.sell_price))
+                networks = await asyncio.gather(*coros)
+                
+                for i, opp in enumerate(opportunities):
+                    opportunities[i] = replace(
+                        opp,
+                        buy_exchange_networks=networks[2 * i],
+                        sell_exchange_networks=networks[2 * i + 1]
+                    )
+                
+                await telegram_notifier.send_arbitrage_alerts(opportunities)
+                
+            except Exception as e:
+                self.logger.error(f"Ошибка отправки уведомлений: {e}")
+            finally:
+                self._alert_queue.task_done()
+    
+    async def flush_alerts(self):
+        """Дождаться отправки уведомлений из очереди и остановить потребителя"""
+        if self._alert_consumer is None:
+            return
+        
+        if not self._alert_consumer.done():
+            await self._alert_queue.join()
+        self._alert_consumer.cancel()
+        self._alert_consumer = None
     
     async def fetch_popular_symbols(self, limit: int = 200) -> List[str]:
         """Получение популярных символов на основе объема торгов"""
@@ -275,30 +535,31 @@ class ExchangeManager:
         try:
             binance = self.exchanges.get('binance')
             if binance:
-            	if asyncio.iscoroutinefunction(binance.fetch_tickers):
-            		tickers = await binance.fetch_tickers()
-            	else:
-                	# Запускаем синхронный метод в отдельном потоке
-                	loop = asyncio.get_event_loop()
-                	tickers = await loop.run_in_executor(None, binance.fetch_tickers)
-				
-            	for symbol, ticker in tickers.items():
-            		if self._is_valid_symbol(symbol, binance.markets.get(symbol, {})):
-            			volume_usd = ticker.get('quoteVolume', 0) or 0
-            			if volume_usd >= self.config.MIN_VOLUME_USD:
-            				symbol_volumes[symbol] = volume_usd
+                await self._wait_markets('binance')
+                async with self._admission:
+                    tickers = await binance.fetch_tickers()
+                
+                # Проверка объема и валидности символа за один проход (валидность - поиск в множестве)
+                valid = self._valid_symbol_set('binance')
+                min_volume = self.config.MIN_VOLUME_USD
+                for symbol, ticker in tickers.items():
+                    if symbol in valid:
+                        volume = ticker.get('quoteVolume') or 0.0
+                        if volume >= min_volume:
+                            symbol_volumes[symbol] = volume
                             
         except Exception as e:
             self.logger.error(f"Ошибка получения популярных символов: {e}")
         
-        # Сортируем по объему и берем топ
-        sorted_symbols = sorted(symbol_volumes.items(), key=lambda x: x[1], reverse=True)
-        popular_symbols = [symbol for symbol, _ in sorted_symbols[:limit]]
+        # Топ по объему через кучу вместо полной сортировки
+        popular_symbols = [
+            symbol for symbol, _ in heapq.nlargest(limit, symbol_volumes.items(), key=itemgetter(1))
+        ]
         
         # Исключаем топ монеты
         filtered_symbols = [
             symbol for symbol in popular_symbols 
-            if not any(excluded in symbol.split('/')[0] for excluded in self.config.EXCLUDED_SYMBOLS)
+            if symbol.split('/', 1)[0] not in self.config.EXCLUDED_SYMBOLS_SET
         ]
         
         self.logger.info(f"Найдено {len(filtered_symbols)} популярных символов")
@@ -306,12 +567,27 @@ class ExchangeManager:
     
     async def close_all_exchanges(self):
         """Закрытие всех подключений к биржам"""
-        for exchange_name, exchange in self.exchanges.items():
-            try:
-                await exchange.close()
-                self.logger.info(f"Закрыто подключение к {exchange_name}")
-            except Exception as e:
-                self.logger.error(f"Ошибка закрытия {exchange_name}: {e}")
+        for task in [*self._watchers.values(), *self._market_tasks.values()]:
+            task.cancel()
+        self._watchers.clear()
+        self._market_tasks.clear()
+        
+        await asyncio.gather(
+            *(self._safe_close(exchange_name, exchange) for exchange_name, exchange in self.exchanges.items()),
+            return_exceptions=True
+        )
+        
+        # Собственную сессию закрываем после всех бирж (переданную закрывает владелец)
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+    
+    async def _safe_close(self, exchange_name: str, exchange):
+        """Закрытие подключения к бирже с логированием ошибки"""
+        try:
+            await exchange.close()
+            self.logger.info(f"Закрыто подключение к {exchange_name}")
+        except Exception as e:
+            self.logger.error(f"Ошибка закрытия {exchange_name}: {e}")
     
     def get_exchange_names(self) -> List[str]:
         """Получение списка подключенных бирж"""
@@ -5,6 +5,7 @@ import asyncio
 import logging
 import signal
 import sys
+import time
 from datetime import datetime
 from typing import List
 import os
@@ -12,13 +13,20 @@ from dotenv import load_dotenv
 from simple_config import SimpleConfig
 from data_models import PriceData, ArbitrageOpportunity
 from arbitrage_analyzer import ArbitrageAnalyzer
-from exchange_manager import ExchangeManager
+from exchange_manager import ExchangeManager, create_http_session
 from telegram_notifier import TelegramNotifier
 
+# Быстрый event loop на libuv (нет под Windows - остается стандартный asyncio)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 
 class ArbitrageBotSystem:
     def __init__(self):
         self.config = SimpleConfig()
+        self.shared_session = None
         self.exchange_manager = None
         self.arbitrage_analyzer = None
         self.telegram_notifier = None
@@ -52,8 +60,13 @@ class ArbitrageBotSystem:
             if not self.config.TELEGRAM_CHAT_ID:
                 raise Exception("TELEGRAM_CHAT_ID не задан")
 
+            # Общая HTTP сессия для всех бирж
+            self.shared_session = create_http_session()
+
             # Инициализация менеджера бирж
-            self.exchange_manager = ExchangeManager(self.config)
+            self.exchange_manager = ExchangeManager(self.config, session=self.shared_session)
+            await self.exchange_manager.initialize_exchanges()
+            self.logger.info("✅ Биржи инициализированы, рынки загружаются в фоне")
 
             # Инициализация анализатора арбитража
             self.arbitrage_analyzer = ArbitrageAnalyzer(self.config)
@@ -103,13 +116,13 @@ class ArbitrageBotSystem:
 
         while self.is_running:
             try:
-                cycle_start = datetime.now()
+                cycle_start = time.monotonic()
                 cycle_count += 1
 
                 self.logger.info(f"🔄 Цикл мониторинга #{cycle_count} начат...")
 
-                await self.exchange_manager.initialize_exchanges()
-                self.logger.info("✅ Биржи load markets успешны")
+                # Рынки перезагружаются в фоне только по истечении их TTL
+                self.exchange_manager.refresh_markets()
 
                 # Получаем символы для мониторинга
                 symbols = await self.get_monitoring_symbols()
@@ -125,7 +138,7 @@ class ArbitrageBotSystem:
                 self.arbitrage_analyzer.update_session_stats()
 
                 # Рассчитываем время выполнения
-                cycle_duration = (datetime.now() - cycle_start).total_seconds()
+                cycle_duration = time.monotonic() - cycle_start
                 self.logger.info(
                     f"⏱️ Цикл #{cycle_count} завершен за {cycle_duration:.2f} сек")
 
@@ -169,6 +182,10 @@ class ArbitrageBotSystem:
         self.is_running = False
 
         try:
+            # Досылаем уведомления из очереди, пока Telegram клиент еще открыт
+            if self.exchange_manager:
+                await self.exchange_manager.flush_alerts()
+
             if self.telegram_notifier:
                 session_summary = self.arbitrage_analyzer.get_session_summary()
                 await self.telegram_notifier.send_system_message(f"🛑 Система завершает работу\n\n{session_summary}")
@@ -177,6 +194,9 @@ class ArbitrageBotSystem:
             if self.exchange_manager:
                 await self.exchange_manager.close_all_exchanges()
 
+            if self.shared_session:
+                await self.shared_session.close()
+
             self.logger.info("✅ Система корректно завершена")
 
         except Exception as e:
@@ -259,6 +279,9 @@ if __name__ == "__main__":
         print("\nИли создайте .env файл с этими переменными")
         sys.exit(1)
 
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
     # Запускаем систему
     try:
         asyncio.run(main())
@@ -1,7 +1,7 @@
 # simple_config.py - Исправленная конфигурация без ошибок dataclass
 import os
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Dict, FrozenSet
 
 @dataclass
 class SimpleConfig:
@@ -14,6 +14,16 @@ class SimpleConfig:
     MIN_VOLUME_USD: float = field(default_factory=lambda: float(os.getenv('MIN_VOLUME', '50000')))
     UPDATE_INTERVAL: int = field(default_factory=lambda: int(os.getenv('UPDATE_INTERVAL', '60')))
     
+    # Максимум одновременных HTTP запросов к биржам
+    MAX_CONCURRENT_REQUESTS: int = field(default_factory=lambda: int(os.getenv('MAX_CONCURRENT_REQUESTS', '16')))
+    
+    # Время жизни кэша тикеров и рынков бирж (секунды)
+    TICKER_TTL_SECONDS: float = field(default_factory=lambda: float(os.getenv('TICKER_TTL_SECONDS', '5')))
+    MARKETS_TTL_SECONDS: float = field(default_factory=lambda: float(os.getenv('MARKETS_TTL_SECONDS', '3600')))
+    
+    # Цены по WebSocket (ccxt.pro watch_tickers) вместо REST опроса каждый цикл
+    USE_WEBSOCKETS: bool = field(default_factory=lambda: os.getenv('USE_WEBSOCKETS', 'false').lower() == 'true')
+    
     # Биржи для мониторинга
     EXCHANGES: List[str] = field(default_factory=lambda: [
         'binance', 'bybit', 
@@ -65,6 +75,8 @@ class SimpleConfig:
         'DOGE', 'MATIC', 'DOT', 'AVAX', 'SHIB', 'LTC', 'UNI',
         'BUSD', 'DAI', 'TUSD', 'USDD', 'FRAX'
     ])
+    # Множество исключений для проверки базовой валюты за O(1) (заполняется в __post_init__)
+    EXCLUDED_SYMBOLS_SET: FrozenSet[str] = field(init=False, repr=False)
     
     # Настройки уведомлений
     MAX_ALERTS_PER_CYCLE: int = field(default_factory=lambda: int(os.getenv('MAX_ALERTS', '5')))
@@ -72,4 +84,7 @@ class SimpleConfig:
     
     # Логирование
     LOG_LEVEL: str = field(default_factory=lambda: os.getenv('LOG_LEVEL', 'INFO'))
-    LOG_FILE: str = field(default_factory=lambda: os.getenv('LOG_FILE', 'arbitrage.log'))
\ No newline at end of file
+    LOG_FILE: str = field(default_factory=lambda: os.getenv('LOG_FILE', 'arbitrage.log'))
+
+    def __post_init__(self):
+        self.EXCLUDED_SYMBOLS_SET = frozenset(self.EXCLUDED_SYMBOLS)
@@ -1,33 +1,253 @@
 # telegram_notifier.py - Упрощенный Telegram уведомитель без базы данных
 import asyncio
 import httpx
-from typing import List
+from typing import Dict, List, Optional, Set, Union
 from datetime import datetime
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from data_models import ArbitrageOpportunity
 import os
-import json
+import time
+import orjson
+import msgspec
+
+# Схемы ответов Bot API: msgspec декодирует JSON сразу в структуры, лишние поля пропускаются
+class BotInfo(msgspec.Struct):
+    first_name: str
+
+
+class GetMeResp(msgspec.Struct):
+    ok: bool
+    result: BotInfo
+
+
+class Chat(msgspec.Struct):
+    id: int
+
+
+class Message(msgspec.Struct):
+    chat: Chat
+
+
+class Update(msgspec.Struct):
+    update_id: int
+    message: Optional[Message] = None
+
+
+class GetUpdatesResp(msgspec.Struct):
+    ok: bool
+    result: List[Update] = []
+
+
+# Глобальный лимит Telegram ~30 сообщений в секунду - держим запас
+SEND_RATE_PER_SECOND = 25
+
+# Интервал между сообщениями в один чат (лимит Telegram ~1 сообщение в секунду на чат)
+PER_CHAT_SEND_INTERVAL = 1.05
+
+# Попыток отправки при ответе 429 (Too Many Requests), 5xx и сетевых ошибках
+MAX_SEND_ATTEMPTS = 3
+
+# Базовая пауза экспоненциального повтора после 5xx и сетевых ошибок (0.5, 1, 2... сек)
+RETRY_BACKOFF_SECONDS = 0.5
+
+# Несколько уведомлений склеиваются в одно сообщение (лимит Telegram 4096 символов, держим запас)
+MAX_MESSAGE_CHARS = 3900
+ALERT_SEPARATOR = "\n━━━━━━━━━\n"
+
+# Заголовки запроса с готовым JSON телом
+_HEADERS_JSON = {"content-type": "application/json"}
+
+# Файл со списком пользователей бота
+USERS_FILE = "users.json"
+
+# Иконка сигнала (масштабирование по спреду отключено)
+# x = int(opportunity.price_difference_percent // 1.95)
+SIGNAL_ICON = "🚨"
+
+# Шаблон уведомления об арбитраже: разбирается один раз, заполняется через format_map
+ALERT_TEMPLATE = """
+{icons} <b>АРБИТРАЖ {pct:.2f}%</b>
+
+💎 <b>Монета:</b> {symbol}
+💰 <b>Спред:</b> <b>{pct:.2f}%</b>
+
+📈 <b>КУПИТЬ:</b>
+🏛️ Биржа: <b>{buy_exchange}</b>
+💵 Цена: <code>${buy_price:.8f}</code>
+🌐 Cеть: {buy_networks}
+
+📉 <b>ПРОДАТЬ:</b>
+🏛️ Биржа: <b>{sell_exchange}</b>
+💵 Цена: <code>${sell_price:.8f}</code>
+🌐 Cеть: {sell_networks}
+
+📊 <b>Данные:</b>
+📈 Объем 24ч: <code>${volume:,.0f}</code>
+⏰ Время: <code>{time}</code>
+""".strip()
+
+
+def _read_users_json(cached: Optional[tuple] = None) -> Optional[tuple]:
+    """Чтение users.json: (mtime, users) или None если файла нет.
+
+    Если mtime совпадает с кэшем, файл не разбирается и возвращается cached.
+    """
+    try:
+        with open(USERS_FILE, 'rb') as f:
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+            if cached is not None and cached[0] == mtime:
+                return cached
+            return mtime, orjson.loads(f.read()).get('users', [])
+    except FileNotFoundError:
+        return None
+
+
+def _retry_after(response: httpx.Response) -> float:
+    """Пауза из ответа 429 (parameters.retry_after); 1 сек, если тело не JSON от Telegram"""
+    try:
+        return float(orjson.loads(response.content)['parameters']['retry_after'])
+    except (ValueError, TypeError, KeyError):
+        return 1.0
+
+
+class _RootForwarder(logging.Handler):
+    """Передает записи из очереди обработчикам корневого логгера, актуальным на момент записи"""
+    def emit(self, record: logging.LogRecord):
+        logging.getLogger().handle(record)
+
+
+# Очередь логов модуля: одна на все экземпляры уведомителя, обработчик добавляется один раз
+_logger = logging.getLogger(__name__)
+_log_queue = queue.SimpleQueue()
+_log_handler = QueueHandler(_log_queue)
+_log_listener = QueueListener(_log_queue, _RootForwarder())
+_log_users = 0
+
+
+def _acquire_queued_logging():
+    """Включение записи логов модуля через очередь (первым экземпляром уведомителя)"""
+    global _log_users
+    if _log_users == 0:
+        _logger.addHandler(_log_handler)
+        _logger.propagate = False
+        _log_listener.start()
+    _log_users += 1
+
+
+def _release_queued_logging():
+    """Отключение очереди логов после закрытия последнего экземпляра"""
+    global _log_users
+    _log_users -= 1
+    if _log_users == 0:
+        _log_listener.stop()
+        _logger.removeHandler(_log_handler)
+        _logger.propagate = True
+
+
+class TokenBucket:
+    """Ведро токенов на monotonic часах: не больше rate отправок в секунду с запасом capacity"""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+    
+    def pause(self, seconds: float):
+        """Остановка выдачи токенов на seconds (ответ 429): запас обнуляется, пополнение - после паузы"""
+        self._tokens = 0.0
+        self._updated = max(self._updated, time.monotonic() + seconds)
 
 class TelegramNotifier:
+    # Заголовок системных уведомлений
+    SYSTEM_MESSAGE_PREFIX = "🤖 <b>Система ArbitrageBot</b>\n\n"
+    
     def __init__(self, config):
         self.config = config
         self.bot_token = config.TELEGRAM_BOT_TOKEN
         self.chat_id = config.TELEGRAM_CHAT_ID
+        # Получатели уведомлений: TELEGRAM_CHAT_ID может содержать несколько id через запятую
+        self.chat_ids = [chat_id.strip() for chat_id in str(config.TELEGRAM_CHAT_ID).split(',') if chat_id.strip()]
+        if self.chat_ids:
+            self.chat_id = self.chat_ids[0]
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
         self.client = None
+        self._send_url = None
+        self._send_headers = None
         self.logger = logging.getLogger(__name__)
         
+        # Сообщение о запуске зависит только от конфигурации - собираем один раз
+        self._exchanges_str = ', '.join(self.config.EXCHANGES)
+        self._startup_msg = f"""
+🚀 <b>ArbitrageBot запущен!</b>
+
+⚙️ <b>Настройки:</b>
+• Порог спреда: <b>{self.config.PRICE_DIFFERENCE_THRESHOLD}%</b>
+• Минимальный объем: <b>${self.config.MIN_VOLUME_USD:,}</b>
+• Интервал обновления: <b>{self.config.UPDATE_INTERVAL} сек</b>
+• Максимум уведомлений за цикл: <b>{self.config.MAX_ALERTS_PER_CYCLE}</b>
+• Cooldown между уведомлениями: <b>{self.config.ALERT_COOLDOWN_MINUTES} мин</b>
+
+🏛️ <b>Мониторимые биржи:</b>
+{self._exchanges_str}
+
+📊 <b>Статус:</b> ✅ Активно мониторю рынок!
+
+🔔 Вы будете получать уведомления только о новых возможностях арбитража.
+        """.strip()
+        
+        # Логи уходят в очередь, запись в обработчики - в фоновом потоке (не блокирует event loop)
+        _acquire_queued_logging()
+        self._queued_logging = True
+        
+        # Кэш пользователей: (mtime_ns файла, список) - перечитываем файл только при изменении
+        self._users_cache = None
+        
+        # Одновременные запросы и темп отправки в пределах лимитов Telegram
+        self._global_sem = asyncio.Semaphore(SEND_RATE_PER_SECOND)
+        self._send_bucket = TokenBucket(SEND_RATE_PER_SECOND, SEND_RATE_PER_SECOND)
+        
+        # Время (time.monotonic) ближайшей разрешенной отправки по чатам; после 429 сдвигается на retry_after
+        self._next_send_ts: Dict[Union[int, str], float] = {}
+        # Очередь отправок по чатам: asyncio.Lock пропускает ожидающих по порядку
+        self._chat_locks: Dict[Union[int, str], asyncio.Lock] = {}
+        
+        # Отправки в процессе: close() отменяет и дожидается их до закрытия клиента
+        self._tasks: Set[asyncio.Task] = set()
+        
     async def initialize(self):
         """Инициализация Telegram клиента"""
         try:
-            self.client = httpx.AsyncClient(timeout=30.0)
+            # Один клиент на все запросы: keep-alive и HTTP/2 мультиплексирование к api.telegram.org
+            self.client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=True,
+                timeout=httpx.Timeout(30.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60)
+            )
+            
+            # URL и заголовки sendMessage разбираем один раз, а не при каждой отправке
+            self._send_url = httpx.URL("/sendMessage")
+            self._send_headers = httpx.Headers(_HEADERS_JSON)
             
             # Проверяем токен бота
-            response = await self.client.get(f"{self.base_url}/getMe")
+            response = await self.client.get("/getMe")
             if response.status_code == 200:
-                bot_info = response.json()
-                bot_name = bot_info['result']['first_name']
-                self.logger.info(f"✅ Telegram бот подключен: {bot_name}")
+                bot_info = msgspec.json.decode(response.content, type=GetMeResp)
+                self.logger.info("✅ Telegram бот подключен: %s", bot_info.result.first_name)
             else:
                 raise Exception(f"Неверный токен бота: {response.text}")
                 
@@ -38,22 +258,21 @@ class TelegramNotifier:
     async def get_all_chat_ids(self) -> List[int]:
         try:
             # Проверяем токен бота
-            response = await self.client.get(f"{self.base_url}/getUpdates")
+            response = await self.client.get("/getUpdates")
             if response.status_code == 200:
-                updates_info = response.json()
-                print(f"{self.base_url}/getUpdates")
-                print(updates_info)
-                results = updates_info['result']
-                chat_ids = {}
-                for result in results:
-                	self.logger.info(f"getUpdate result: {result}")
-                	if result['message']:
-                		chat_ids.add(result['chat']['id'])
+                updates_info = msgspec.json.decode(response.content, type=GetUpdatesResp)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    self.logger.debug("getUpdates: получено обновлений %d", len(updates_info.result))
+                chat_ids = set()
+                for result in updates_info.result:
+                    self.logger.info(f"getUpdate result: {result}")
+                    if result.message is not None:
+                        chat_ids.add(result.message.chat.id)
                 self.logger.info(f"✅ chat_ids: {chat_ids}")
                 return list(chat_ids)
             else:
-            	raise Exception(f"Неверный токен бота: {response.text}")
-            	
+                raise Exception(f"Неверный токен бота: {response.text}")
+                
         except Exception as e:
             self.logger.error(f"Ошибка инициализации Telegram: {e}")
             raise
@@ -61,43 +280,108 @@ class TelegramNotifier:
     async def load_users(self) -> List:
         """Загрузка пользователей из файла"""
         try:
-            if os.path.exists("users.json"):
-                with open("users.json", 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                users = data.get('users', [])
-                    
-                self.logger.info(f"Загружено {len(users)} пользователей")
-                
-                return users
-            else:
+            # Чтение и разбор вне event loop, при неизменном mtime вернется кэш
+            users_cache = await asyncio.to_thread(_read_users_json, self._users_cache)
+            if users_cache is None:
                 self.logger.info("Файл пользователей не найден, создается новый")
                 return []
+            
+            if users_cache is not self._users_cache:
+                self._users_cache = users_cache
+                self.logger.info(f"Загружено {len(users_cache[1])} пользователей")
+            
+            return users_cache[1]
                 
         except Exception as e:
             self.logger.error(f"Ошибка загрузки пользователей: {e}")
             raise
     
-    async def send_message(self, text: str, parse_mode: str = 'HTML') -> bool:
-        """Отправка сообщения в Telegram"""
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/sendMessage",
-                json={
-                    "chat_id": self.chat_id,
-                    "text": text,
-                    "parse_mode": parse_mode,
-                    "disable_web_page_preview": True
-                }
-            )
-            
-            if response.status_code == 200:
-                return True
-            else:
-                self.logger.error(f"Ошибка отправки сообщения: {response.text}")
-                return False
+    async def send_message(self, text: str, parse_mode: str = 'HTML',
+                           chat_id: Optional[Union[int, str]] = None) -> bool:
+        """Отправка сообщения в Telegram (с учетом лимитов и повторами)"""
+        if chat_id is None:
+            chat_id = self.chat_id
+        
+        payload = {
+            "text": text,
+            "parse_mode": parse_mode,
+            "disable_web_page_preview": True
+        }
+        return await self._spawn(self._post_to_chat(chat_id, payload))
+    
+    async def _broadcast(self, text: str, chat_ids: List[Union[int, str]]) -> bool:
+        """Отправка одного текста всем чатам одновременно (общий payload, одно HTTP/2 соединение)"""
+        payload = {
+            "text": text,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": True
+        }
+        results = await asyncio.gather(*(self._spawn(self._post_to_chat(chat_id, payload)) for chat_id in chat_ids))
+        return all(results)
+    
+    def _spawn(self, coro) -> asyncio.Task:
+        """Запуск отправки отдельной задачей с учетом в self._tasks"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+    
+    async def _post_to_chat(self, chat_id: Union[int, str], payload: dict) -> bool:
+        """POST sendMessage в чат: темп чата, общий лимит и повторы после 429/5xx/сетевых ошибок"""
+        # Сообщения в один чат уходят строго по очереди: пауза после 429 задерживает и следующие,
+        # поэтому они не обгоняют повторяемое сообщение
+        chat_lock = self._chat_locks.get(chat_id)
+        if chat_lock is None:
+            chat_lock = self._chat_locks[chat_id] = asyncio.Lock()
+        
+        # Запрос собираем один раз (orjson сразу дает bytes) и переиспользуем при повторах
+        request = self.client.build_request(
+            "POST",
+            self._send_url,
+            content=orjson.dumps({"chat_id": chat_id, **payload}),
+            headers=self._send_headers
+        )
+        
+        async with chat_lock:
+            for attempt in range(MAX_SEND_ATTEMPTS):
+                # Время разрешенной отправки перечитываем перед каждой попыткой
+                wait = self._next_send_ts.get(chat_id, 0.0) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
                 
-        except Exception as e:
-            self.logger.error(f"Ошибка отправки в Telegram: {e}")
+                try:
+                    async with self._global_sem:
+                        await self._send_bucket.acquire()
+                        response = await self.client.send(request)
+                    self._next_send_ts[chat_id] = time.monotonic() + PER_CHAT_SEND_INTERVAL
+                    response.raise_for_status()
+                    return True
+                
+                except httpx.HTTPStatusError as e:
+                    status = e.response.status_code
+                    if status == 429:
+                        # Превышен лимит: Telegram сообщает, сколько секунд ждать - ждет весь чат и общий темп
+                        delay = _retry_after(e.response)
+                        reason = "Лимит Telegram"
+                        self._send_bucket.pause(delay)
+                    elif status >= 500:
+                        delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+                        reason = f"Ошибка сервера Telegram {status}"
+                    else:
+                        # Остальные 4xx (неверный чат, разметка) повтором не исправить
+                        self.logger.error("Ошибка отправки сообщения: %s", e.response.text)
+                        return False
+                
+                except (httpx.TransportError, asyncio.TimeoutError) as e:
+                    delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    reason = f"Ошибка соединения с Telegram: {e}"
+                
+                # Следующая отправка в чат (повтор или очередное сообщение) - не раньше чем через delay
+                self._next_send_ts[chat_id] = max(self._next_send_ts.get(chat_id, 0.0), time.monotonic() + delay)
+                if attempt + 1 < MAX_SEND_ATTEMPTS:
+                    self.logger.warning("%s, повтор через %.1f сек", reason, delay)
+            
+            self.logger.error("Ошибка отправки сообщения: исчерпаны повторы (%s)", reason)
             return False
     
     async def send_arbitrage_alerts(self, opportunities: List[ArbitrageOpportunity]):
@@ -106,44 +390,54 @@ class TelegramNotifier:
             return
             
         try:
-            for i, opportunity in enumerate(opportunities):
-                profit_calc = opportunity.profit_estimation()
+            # Метод шаблона связываем один раз вне цикла
+            render = ALERT_TEMPLATE.format_map
+            alert_messages = []
+            for opportunity in opportunities:
+                # Время форматируем один раз: срез isoformat быстрее strftime
+                time_str = opportunity.timestamp.isoformat(timespec='seconds')[11:19]
                 
-                # x = int(opportunity.price_difference_percent // 1.95)
-                signal_icons = "🚨"
-
                 # Создаем красивое уведомление
-                alert_message = f"""
-{signal_icons} <b>АРБИТРАЖ {opportunity.price_difference_percent:.2f}%</b>
-
-💎 <b>Монета:</b> {opportunity.symbol}
-💰 <b>Спред:</b> <b>{opportunity.price_difference_percent:.2f}%</b>
-
-📈 <b>КУПИТЬ:</b>
-🏛️ Биржа: <b>{opportunity.buy_exchange}</b>
-💵 Цена: <code>${opportunity.buy_price:.8f}</code>
-🌐 Cеть: {opportunity.buy_exchange_networks}
-
-📉 <b>ПРОДАТЬ:</b>
-🏛️ Биржа: <b>{opportunity.sell_exchange}</b>
-💵 Цена: <code>${opportunity.sell_price:.8f}</code>
-🌐 Cеть: {opportunity.sell_exchange_networks}
-
-📊 <b>Данные:</b>
-📈 Объем 24ч: <code>${opportunity.min_volume_24h:,.0f}</code>
-⏰ Время: <code>{opportunity.timestamp.strftime('%H:%M:%S')}</code>
-                """.strip()
-                
-                success = await self.send_message(alert_message)
-                
-                if success:
-                    self.logger.info(f"✅ Уведомление отправлено: {opportunity.symbol}")
-                else:
-                    self.logger.error(f"❌ Не удалось отправить уведомление: {opportunity.symbol}")
-                
-                # Пауза между сообщениями (избегаем лимиты)
-                if i < len(opportunities) - 1:
-                    await asyncio.sleep(2)
+                alert_message = render({
+                    'icons': SIGNAL_ICON,
+                    'pct': opportunity.price_difference_percent,
+                    'symbol': opportunity.symbol,
+                    'buy_exchange': opportunity.buy_exchange,
+                    'buy_price': opportunity.buy_price,
+                    'buy_networks': opportunity.buy_exchange_networks,
+                    'sell_exchange': opportunity.sell_exchange,
+                    'sell_price': opportunity.sell_price,
+                    'sell_networks': opportunity.sell_exchange_networks,
+                    'volume': opportunity.min_volume_24h,
+                    'time': time_str,
+                })
+                alert_messages.append(alert_message)
+            
+            # Пакуем уведомления в сообщения до MAX_MESSAGE_CHARS символов: меньше запросов и токенов лимита
+            batches = []
+            batch, batch_len = [], 0
+            for opportunity, alert_message in zip(opportunities, alert_messages):
+                added_len = len(alert_message) + len(ALERT_SEPARATOR)
+                if batch and batch_len + added_len > MAX_MESSAGE_CHARS:
+                    batches.append(batch)
+                    batch, batch_len = [], 0
+                batch.append((opportunity, alert_message))
+                batch_len += added_len
+            if batch:
+                batches.append(batch)
+            
+            # Каждое сообщение рассылаем всем получателям; темп задают лимиты в _post_to_chat
+            results = await asyncio.gather(*(
+                self._broadcast(ALERT_SEPARATOR.join(message for _, message in batch), self.chat_ids)
+                for batch in batches
+            ))
+            
+            for batch, success in zip(batches, results):
+                for opportunity, _ in batch:
+                    if success:
+                        self.logger.info("✅ Уведомление отправлено: %s", opportunity.symbol)
+                    else:
+                        self.logger.error("❌ Не удалось отправить уведомление: %s", opportunity.symbol)
                 
         except Exception as e:
             self.logger.error(f"Ошибка отправки уведомлений об арбитраже: {e}")
@@ -151,33 +445,14 @@ class TelegramNotifier:
     async def send_system_message(self, message: str):
         """Отправка системных уведомлений"""
         try:
-            system_message = f"🤖 <b>Система ArbitrageBot</b>\n\n{message}"
-            await self.send_message(system_message)
+            await self.send_message(self.SYSTEM_MESSAGE_PREFIX + message)
             
         except Exception as e:
             self.logger.error(f"Ошибка отправки системного сообщения: {e}")
     
     async def send_startup_message(self):
         """Отправка сообщения о запуске"""
-        startup_message = f"""
-🚀 <b>ArbitrageBot запущен!</b>
-
-⚙️ <b>Настройки:</b>
-• Порог спреда: <b>{self.config.PRICE_DIFFERENCE_THRESHOLD}%</b>
-• Минимальный объем: <b>${self.config.MIN_VOLUME_USD:,}</b>
-• Интервал обновления: <b>{self.config.UPDATE_INTERVAL} сек</b>
-• Максимум уведомлений за цикл: <b>{self.config.MAX_ALERTS_PER_CYCLE}</b>
-• Cooldown между уведомлениями: <b>{self.config.ALERT_COOLDOWN_MINUTES} мин</b>
-
-🏛️ <b>Мониторимые биржи:</b>
-{', '.join(self.config.EXCHANGES)}
-
-📊 <b>Статус:</b> ✅ Активно мониторю рынок!
-
-🔔 Вы будете получать уведомления только о новых возможностях арбитража.
-        """.strip()
-        
-        await self.send_message(startup_message)
+        await self.send_message(self._startup_msg)
     
     async def send_market_summary(self, market_overview: dict):
         """Отправка сводки рынка"""
@@ -202,7 +477,7 @@ class TelegramNotifier:
 • Возможностей найдено: <b>{session_stats.get('total_opportunities_found', 0)}</b>
 • Уведомлений отправлено: <b>{session_stats.get('alerts_sent', 0)}</b>
 
-⏰ <b>Время:</b> {market_overview['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}
+⏰ <b>Время:</b> {market_overview['timestamp'].isoformat(' ', 'seconds')[:19]}
             """.strip()
             
             await self.send_message(summary_message)
@@ -212,6 +487,17 @@ class TelegramNotifier:
     
     async def close(self):
         """Закрытие Telegram клиента"""
+        # Отменяем незавершенные отправки и дожидаемся их, пока клиент еще открыт
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        
         if self.client:
             await self.client.aclose()
             self.logger.info("✅ Telegram клиент закрыт")
+        
+        # Дописываем оставшиеся записи; последний экземпляр возвращает логгер к обычной обработке
+        if self._queued_logging:
+            self._queued_logging = False
+            _release_queued_logging()